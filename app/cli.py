@@ -1,9 +1,11 @@
 import click
 from typing import Optional
 import logging
+import subprocess
 import sys
 from app.core.palette import generate_palette
-from app.database.models import Artwork
+from app.database.models import Artwork, Facet
+from app.database.database import Database
 from tabulate import tabulate
 from peewee import fn
 
@@ -27,6 +29,8 @@ def cli(ctx: click.Context):
         from app.main import serve
         output("App started")
         serve()
+    elif ctx.invoked_subcommand not in ("importtime", "quit"):
+        Artwork.ensure_columns()
 
 
 @cli.command("palette")
@@ -40,17 +44,42 @@ def cli_palette(outpath: Optional[str] = None):
 def cli_stats(categories: bool):
     if categories:
         headers = ["category", "count"]
-        table = [
-            [artwork.Category, artwork.count]
-            for artwork in
-            Artwork.select(
-                Artwork.Category,
-                fn.COUNT(Artwork.id).alias("count")
-            ).group_by(Artwork.Category)
-        ]
+        with Database.reads():
+            table = [
+                [artwork.Category, artwork.count]
+                for artwork in
+                Artwork.select(
+                    Artwork.Category,
+                    fn.COUNT(Artwork.id).alias("count")
+                ).group_by(Artwork.Category)
+            ]
         print(tabulate(table, headers, tablefmt="presto"))
 
 
+@cli.command("facets")
+@click.option("-r", "--rebuild", is_flag=True, default=False)
+def cli_facets(rebuild: bool):
+    if rebuild:
+        Facet.create_table(safe=True)
+        Facet.rebuild()
+    with Database.reads():
+        counts = Facet.counts()
+    for kind, facets in counts.items():
+        print(tabulate(facets.items(), [kind, "count"], tablefmt="presto"))
+        print()
+
+
+@cli.command("snapshot")
+@click.option("-o", "--outpath", default=None)
+def cli_snapshot(outpath: Optional[str] = None):
+    from pathlib import Path
+    from app.core.snapshot import write_snapshot, CatalogueSnapshot
+    path = write_snapshot(Path(outpath) if outpath else None)
+    snapshot = CatalogueSnapshot(path)
+    output(f"{path}: {len(snapshot)} artworks, {len(snapshot.colors)} colors, "
+           f"{path.stat().st_size} bytes")
+
+
 @cli.command("delete")
 @click.argument("slug")
 def cli_delete(slug: str):
@@ -59,6 +88,69 @@ def cli_delete(slug: str):
     artwork.delete_instance()
 
 
+@cli.command("gc")
+@click.option("-g", "--grace-days", type=int, default=None)
+@click.option("-w", "--workers", type=int, default=None)
+@click.option("-n", "--dry-run", is_flag=True, default=False)
+def cli_gc(grace_days: Optional[int], workers: Optional[int], dry_run: bool):
+    from app.core.gc import collect_garbage
+    stats = collect_garbage(
+        grace_days=grace_days,
+        dry_run=dry_run,
+        workers=workers
+    )
+    print(tabulate(stats.items(), ["", "count"], tablefmt="presto"))
+
+
+@cli.command("derivatives")
+@click.option("-w", "--workers", type=int, default=None)
+@click.option("-r", "--restart", is_flag=True, default=False)
+def cli_derivatives(workers: Optional[int], restart: bool):
+    from app.core.derivatives import backfill_derivatives
+    stats = backfill_derivatives(workers=workers, restart=restart)
+    print(tabulate(stats.items(), ["", "count"], tablefmt="presto"))
+
+
+@cli.command("importtime")
+@click.option("-m", "--module", default="app.cli")
+@click.option("-t", "--top", default=15)
+@click.option("-r", "--runs", default=5)
+def cli_importtime(module: str, top: int, runs: int):
+    """Benchmark cold import time of a module in fresh interpreters."""
+    totals = []
+    cumulative: dict[str, int] = {}
+    for _ in range(max(1, runs)):
+        res = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+        )
+        if res.returncode:
+            return error(RuntimeError(res.stderr.strip()))
+        for line in res.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            try:
+                _, cum, name = line.removeprefix("import time:").split("|")
+                us = int(cum)
+            except ValueError:
+                continue
+            pkg = name.strip()
+            cumulative[pkg] = min(cumulative.get(pkg, us), us)
+            if pkg == module:
+                totals.append(us)
+    table = [
+        [name, f"{us / 1000:.1f}"]
+        for name, us in sorted(
+            cumulative.items(), key=lambda x: x[1], reverse=True
+        )[:top]
+    ]
+    print(tabulate(table, ["module", "cumulative ms"], tablefmt="presto"))
+    if totals:
+        output(f"{module}: best {min(totals) / 1000:.1f} ms "
+               f"of {len(totals)} runs")
+
+
 @cli.command("quit")
 def quit():
     """Quit."""
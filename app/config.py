@@ -4,6 +4,8 @@ from typing import Optional
 
 class DbConfig(BaseModel):
     url: str
+    replicas: list[str] = Field(default=[])
+    replica_lag: float = Field(default=5.0)
 
 
 class ApiConfig(BaseModel):
@@ -12,6 +14,7 @@ class ApiConfig(BaseModel):
     assets: str
     workers: Optional[int] = Field(default=1)
     web_host: Optional[str] = Field(default="https://wallies.cacko.net")
+    data: Optional[str] = Field(default="data")
 
 
 class AWSConfig(BaseModel):
@@ -23,10 +26,32 @@ class AWSConfig(BaseModel):
     media_location: str
 
 
+class ImageConfig(BaseModel):
+    widths: list[int] = Field(default=[480, 960, 1440, 1920])
+    formats: list[str] = Field(default=["webp"])
+    workers: int = Field(default=4)
+
+
+class GcConfig(BaseModel):
+    grace_days: int = Field(default=30)
+    interval_hours: int = Field(default=24)
+    workers: int = Field(default=4)
+
+
+class ProfilingConfig(BaseModel):
+    enabled: bool = Field(default=False)
+    token: Optional[str] = Field(default=None)
+    sample_rate: float = Field(default=0.0)
+    size: int = Field(default=50)
+
+
 class Settings(BaseSettings):
     db: DbConfig
     api: ApiConfig
     aws: AWSConfig
+    image: ImageConfig = Field(default_factory=ImageConfig)
+    gc: GcConfig = Field(default_factory=GcConfig)
+    profiling: ProfilingConfig = Field(default_factory=ProfilingConfig)
 
     class Config:
         env_nested_delimiter = '__'
@@ -0,0 +1,23 @@
+from pathlib import Path
+from typing import Optional
+import json
+import os
+
+
+def write_atomic(path: Path, data: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(data)
+    tmp.replace(path)
+
+
+def load_checkpoint(path: Path) -> Optional[dict]:
+    try:
+        data = json.loads(path.read_text())
+        return data if isinstance(data, dict) else None
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_checkpoint(path: Path, data: dict):
+    write_atomic(path, json.dumps(data))
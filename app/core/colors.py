@@ -1,9 +1,6 @@
 from pathlib import Path
-from colorthief import ColorThief
-import numpy as np
 from functools import reduce
 from corefile import TempPath
-from PIL import Image
 
 
 def int_to_rgb(color: int) -> tuple[int, ...]:
@@ -30,7 +27,20 @@ def rgb_to_int(rgb: tuple[int, ...]) -> int:
     return rgb[0] << 16 | rgb[1] << 8 | rgb[2]
 
 
+def color_bucket(rgb: tuple[int, ...], levels=4) -> int:
+    step = 256 // levels
+    return rgb_to_int(tuple(c // step * step + step // 2 for c in rgb[:3]))
+
+
+def bucket_bits(levels=4) -> tuple[int, int]:
+    """Mask and offset such that (color & mask) | offset equals
+    color_bucket for a packed color, levels being a power of two."""
+    step = 256 // levels
+    return (rgb_to_int((256 - step,) * 3), rgb_to_int((step // 2,) * 3))
+
+
 def color_dist(colors: list[tuple[int, ...]], color: tuple[int, ...]) -> int:
+    import numpy as np
     if not len(colors):
         return 500
     np_colors = np.array(colors)
@@ -42,6 +52,7 @@ def color_dist(colors: list[tuple[int, ...]], color: tuple[int, ...]) -> int:
 def similar_colors(
     color: tuple[int, ...], colors: list[tuple[int, ...]], distance=70
 ) -> list[tuple[int, int, int]]:
+    import numpy as np
     np_colors = np.array(colors)
     np_color = np.array(color)
     distances = np.sqrt(np.sum((np_colors - np_color) ** 2, axis=1))
@@ -83,6 +94,8 @@ class DominantColors(object, metaclass=DominantColorsMeta):
 
     @property
     def colors(self) -> list[tuple[int, ...]]:
+        from colorthief import ColorThief
+        from PIL import Image
         thumb_path = TempPath(f"{self.__image_path.name}-colors.jpg")
         img = Image.open(self.__image_path.as_posix())
         img.thumbnail((700, 700))
@@ -0,0 +1,169 @@
+from pathlib import Path
+from typing import Optional
+from corefile import TempPath
+from app.config import app_config
+from app.core.checkpoint import load_checkpoint, save_checkpoint
+import logging
+
+MIME_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+
+def derivative_widths(source_width: int) -> list[int]:
+    """Configured widths narrower than the source, plus one at the source
+    width in place of those it cannot fill."""
+    widths = sorted(set(app_config.image.widths))
+    result = [width for width in widths if width < source_width]
+    if len(result) < len(widths):
+        result.append(source_width)
+    return result
+
+
+def derivative_signature(source_width: int) -> str:
+    """Records the set generated for a source, e.g. "480,700/webp@700"."""
+    return (f"{','.join(map(str, derivative_widths(source_width)))}"
+            f"/{','.join(sorted(set(app_config.image.formats)))}"
+            f"@{source_width}")
+
+
+def source_width(signature: Optional[str]) -> Optional[int]:
+    try:
+        return int(signature.rsplit("@", 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def is_current(signature: Optional[str]) -> bool:
+    width = source_width(signature)
+    return width is not None and signature == derivative_signature(width)
+
+
+def derivative_names(
+    stem: str,
+    signature: Optional[str]
+) -> list[tuple[int, str, str]]:
+    try:
+        widths, formats = signature.split("@")[0].split("/")
+        return [
+            (width, fmt, f"{stem}.{width}w.{fmt}")
+            for width in sorted(map(int, widths.split(",")), reverse=True)
+            for fmt in formats.split(",")
+        ]
+    except (AttributeError, ValueError):
+        return []
+
+
+def generate_derivatives(img, stem: str) -> list[tuple[Path, str]]:
+    """Resize an already decoded image to every width and format planned
+    for it by derivative_signature."""
+    from PIL import Image
+    result = []
+    resized = None
+    for width, fmt, fname in derivative_names(
+            stem, derivative_signature(img.width)):
+        if resized is None or resized.width != width:
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+        out = resized.convert("RGB") if fmt == "jpeg" else resized
+        path = TempPath(fname)
+        out.save(path.as_posix(), format=fmt.upper())
+        result.append((path, fname))
+    return result
+
+
+def upload_derivatives(img, stem: str) -> str:
+    from app.core.s3 import S3
+    for path, fname in generate_derivatives(img, stem):
+        S3.upload(path, fname)
+        path.unlink(missing_ok=True)
+    return derivative_signature(img.width)
+
+
+def checkpoint_path() -> Path:
+    return Path(app_config.api.data) / "derivatives.json"
+
+
+def backfill_artwork(
+    stem: str,
+    previous: Optional[str]
+) -> tuple[Optional[str], Optional[str]]:
+    """Returns the signature of the uploaded set, or the failure."""
+    from PIL import Image
+    from app.core.s3 import S3
+    src = TempPath(f"{stem}.backfill.png")
+    try:
+        S3.download(f"{stem}.png.png", src)
+        with Image.open(src.as_posix()) as img:
+            img.load()
+            signature = upload_derivatives(img, stem)
+        current = {fname for _, _, fname in derivative_names(stem, signature)}
+        if stale := [
+            fname for _, _, fname in derivative_names(stem, previous)
+            if fname not in current
+        ]:
+            S3.delete_many(stale)
+        return signature, None
+    except Exception as e:
+        logging.exception(e)
+        return None, f"{e}"
+    finally:
+        src.unlink(missing_ok=True)
+
+
+def backfill_derivatives(
+    workers: Optional[int] = None,
+    restart: bool = False,
+    batch_size: int = 100
+) -> dict[str, int]:
+    from concurrent.futures import ProcessPoolExecutor
+    from app.database.models import Artwork
+    from app.database.database import Database
+    cfg = app_config.image
+    workers = workers or cfg.workers
+    config = (f"{','.join(map(str, sorted(set(cfg.widths))))}"
+              f"/{','.join(sorted(set(cfg.formats)))}")
+    checkpoint = None if restart else load_checkpoint(checkpoint_path())
+    last_id = 0
+    if checkpoint and checkpoint.get("config") == config:
+        last_id = int(checkpoint.get("id", 0))
+    stats = dict(done=0, failed=0)
+    Artwork.ensure_columns()
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        while True:
+            with Database.reads():
+                batch = list(
+                    Artwork.select(
+                        Artwork.id, Artwork.Image, Artwork.derivatives)
+                    .where(Artwork.deleted == False, Artwork.id > last_id)
+                    .order_by(Artwork.id)
+                    .limit(batch_size)
+                    .tuples()
+                )
+            if not batch:
+                break
+            todo = [row for row in batch if not is_current(row[2])]
+            for (artwork_id, _, _), (signature, failure) in zip(
+                todo, executor.map(
+                    backfill_artwork,
+                    [Path(image).stem for _, image, _ in todo],
+                    [previous for _, _, previous in todo]
+                )
+            ):
+                if failure:
+                    stats["failed"] += 1
+                    logging.warning(
+                        f"backfill stopped at {artwork_id}: {failure}")
+                    return stats
+                Artwork.update(derivatives=signature).where(
+                    Artwork.id == artwork_id).execute()
+                save_checkpoint(checkpoint_path(), dict(
+                    config=config, id=artwork_id))
+                stats["done"] += 1
+            last_id = batch[-1][0]
+            save_checkpoint(checkpoint_path(), dict(config=config, id=last_id))
+            logging.info(f"backfilled up to {last_id}, {stats}")
+    return stats
@@ -0,0 +1,100 @@
+from pathlib import Path
+from typing import Optional
+from datetime import datetime, timedelta
+from app.config import app_config
+from app.core.s3 import S3, DELETE_BATCH_SIZE
+from app.core.checkpoint import load_checkpoint, save_checkpoint
+from app.database.models import Artwork, Artcolor
+import logging
+
+
+def checkpoint_path() -> Path:
+    return Path(app_config.api.data) / "gc.json"
+
+
+def load_cursor() -> Optional[tuple[datetime, int]]:
+    try:
+        data = load_checkpoint(checkpoint_path()) or {}
+        return datetime.fromisoformat(data["last_modified"]), int(data["id"])
+    except (KeyError, ValueError):
+        return None
+
+
+def save_cursor(artwork: Artwork):
+    save_checkpoint(checkpoint_path(), dict(
+        last_modified=artwork.last_modified.isoformat(),
+        id=artwork.id
+    ))
+
+
+def get_expired(
+    cutoff: datetime,
+    after: Optional[tuple[datetime, int]],
+    limit: int
+) -> list[Artwork]:
+    filters = [Artwork.deleted == True, Artwork.last_modified < cutoff]
+    if after:
+        last_modified, last_id = after
+        filters.append(
+            (Artwork.last_modified > last_modified)
+            | ((Artwork.last_modified == last_modified)
+               & (Artwork.id > last_id))
+        )
+    return list(
+        Artwork.select()
+        .where(*filters)
+        .order_by(Artwork.last_modified, Artwork.id)
+        .limit(limit)
+    )
+
+
+def collect_garbage(
+    grace_days: Optional[int] = None,
+    dry_run: bool = False,
+    workers: Optional[int] = None
+) -> dict[str, int]:
+    cfg = app_config.gc
+    grace_days = cfg.grace_days if grace_days is None else grace_days
+    workers = workers or cfg.workers
+    cutoff = datetime.now() - timedelta(days=grace_days)
+    image = app_config.image
+    files_per_artwork = 3 + len(set(image.widths)) * len(set(image.formats))
+    page_size = workers * max(1, DELETE_BATCH_SIZE // files_per_artwork)
+    cursor = load_cursor()
+    stats = dict(artworks=0, objects=0, colors=0, failed=0)
+
+    while artworks := get_expired(cutoff, cursor, page_size):
+        keys = [key for artwork in artworks for key in artwork.image_files]
+        if dry_run:
+            logging.info(f"gc dry run: {len(artworks)} artworks, "
+                         f"{len(keys)} objects")
+            failed = set()
+        else:
+            failed = set(S3.delete_many(keys, workers=workers))
+
+        purged = []
+        for artwork in artworks:
+            if failed.intersection(map(S3.src_key, artwork.image_files)):
+                break
+            purged.append(artwork)
+
+        if purged:
+            ids = [artwork.id for artwork in purged]
+            if dry_run:
+                stats["colors"] += Artcolor.select().where(
+                    Artcolor.Artwork.in_(ids)).count()
+            else:
+                stats["colors"] += Artcolor.delete().where(
+                    Artcolor.Artwork.in_(ids)).execute()
+                save_cursor(purged[-1])
+            cursor = (purged[-1].last_modified, purged[-1].id)
+            stats["artworks"] += len(purged)
+            stats["objects"] += sum(len(a.image_files) for a in purged)
+
+        if failed:
+            stats["failed"] += len(failed)
+            logging.warning(f"gc stopped, {len(failed)} objects failed")
+            break
+
+    logging.info(f"gc {'dry run ' if dry_run else ''}{stats}")
+    return stats
@@ -1,18 +1,40 @@
 from pathlib import Path
 from app.config import app_config
 from typing import Optional
-from PIL import Image, ImageDraw
+import json
 import math
-from .colors import hex_to_int, combine_colors
-from app.database.models import Artcolor
+import time
+from .colors import hex_to_int, hex_to_rgb, rgb_to_hex, combine_colors
+from .checkpoint import write_atomic
+from app.database.models import Artwork, Artcolor
+from app.database.database import Database
+
+PALETTE_VERSION = 1
+CHUNK_SIZE = 4096
+
+_palette_cache: dict[str, tuple[int, dict]] = {}
+
+
+def palette_path(outpath: Optional[str] = None) -> Path:
+    return Path(outpath if outpath else app_config.api.assets) / "palette.json"
 
 
 def generate_palette(outpath: Optional[str] = None):
+    from PIL import Image, ImageDraw
+    import numpy as np
     outroot = Path(outpath if outpath else app_config.api.assets)
     tolerance = 70
     size = 500
     output = outroot / "palette.png"
-    colors = [hex_to_int(x.Color) for x in Artcolor.select()]
+    with Database.reads():
+        artcolors = list(
+            Artcolor.select(Artcolor.Artwork, Artcolor.Color, Artcolor.weight)
+            .join(Artwork)
+            .where(Artwork.deleted == False)
+            .order_by(Artcolor.weight.desc())
+            .tuples()
+        )
+    colors = [hex_to_int(color) for _, color, _ in artcolors]
     combined_colors = combine_colors(colors, tolerance=tolerance)
 
     columns = 5
@@ -27,3 +49,62 @@ def generate_palette(outpath: Optional[str] = None):
         canvas.rectangle([(x, y), (x + size - 1, y + size - 1)], fill=color)
 
     result.save(output.as_posix(), "PNG")
+
+    swatches: list[dict] = [
+        dict(color=rgb_to_hex(color), colors=set(), weights={})
+        for color in combined_colors
+    ]
+    if swatches and artcolors:
+        np_colors = np.array(
+            [hex_to_rgb(color) for _, color, _ in artcolors], dtype=np.int32)
+        np_swatches = np.array(combined_colors, dtype=np.int32)
+        nearest = np.concatenate([
+            np.argmin(np.sum(
+                (chunk[:, None, :] - np_swatches[None]) ** 2, axis=2), axis=1)
+            for chunk in np.array_split(
+                np_colors, max(1, len(np_colors) // CHUNK_SIZE + 1))
+        ])
+        for (artwork_id, color, weight), idx in zip(artcolors, nearest):
+            swatch = swatches[idx]
+            swatch["colors"].add(color)
+            swatch["weights"][artwork_id] = swatch["weights"].get(
+                artwork_id, 0) + weight
+
+    data = dict(
+        version=PALETTE_VERSION,
+        generated=time.time(),
+        tolerance=tolerance,
+        swatches=[
+            dict(
+                color=swatch["color"],
+                colors=sorted(swatch["colors"]),
+                artworks=[
+                    artwork_id for artwork_id, _ in sorted(
+                        swatch["weights"].items(),
+                        key=lambda x: (x[1], x[0]),
+                        reverse=True
+                    )
+                ]
+            )
+            for swatch in swatches
+        ]
+    )
+    json_output = palette_path(outpath)
+    write_atomic(json_output, json.dumps(data, separators=(",", ":")))
+
+
+def load_palette(outpath: Optional[str] = None) -> Optional[dict]:
+    path = palette_path(outpath)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _palette_cache.get(path.as_posix())
+    if cached and cached[0] == mtime:
+        return cached[1]
+    data = json.loads(path.read_text())
+    if data.get("version") != PALETTE_VERSION:
+        return None
+    data["index"] = {swatch["color"]: swatch for swatch in data["swatches"]}
+    _palette_cache[path.as_posix()] = (mtime, data)
+    return data
@@ -0,0 +1,206 @@
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+from app.config import app_config
+from app.database.database import traced_queries
+from threading import Lock
+import cProfile
+import hmac
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import time
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_ID = re.compile(r"^\d+-[0-9a-f]{8}$")
+TRACE_SUFFIXES = (".html", ".prof")
+
+_cprofile_lock = Lock()
+
+
+def token_matches(token: Optional[str | bytes]) -> bool:
+    expected = app_config.profiling.token
+    if not expected or not token:
+        return False
+    if isinstance(token, str):
+        token = token.encode()
+    return hmac.compare_digest(token, expected.encode())
+
+
+class RequestProfiler(object):
+    """Profiles one request.
+
+    pyinstrument in async mode attributes samples to the request's own
+    task, so other requests interleaving on the event loop stay out of
+    the trace. Without pyinstrument, cProfile sees the whole loop
+    thread, so at most one request is profiled at a time to keep the
+    contamination bounded. Neither sees work FastAPI hands to the
+    threadpool (sync endpoints such as the upload); their SQL is still
+    recorded through execute_sql.
+    """
+
+    def __init__(self) -> None:
+        try:
+            from pyinstrument import Profiler
+            self.kind = "pyinstrument"
+            self.__profiler = Profiler(async_mode="enabled")
+        except ImportError:
+            self.kind = "cprofile"
+            self.__profiler = cProfile.Profile()
+        self.__locked = False
+
+    def start(self) -> bool:
+        if self.kind == "cprofile":
+            if not _cprofile_lock.acquire(blocking=False):
+                return False
+            self.__locked = True
+            try:
+                self.__profiler.enable()
+            except ValueError:
+                self.stop()
+                return False
+            return True
+        try:
+            self.__profiler.start()
+        except RuntimeError:
+            return False
+        return True
+
+    def stop(self):
+        if self.kind == "cprofile":
+            self.__profiler.disable()
+            if self.__locked:
+                self.__locked = False
+                _cprofile_lock.release()
+        else:
+            self.__profiler.stop()
+
+    def dump(self, path: Path) -> str:
+        if self.kind == "cprofile":
+            self.__profiler.dump_stats(path.with_suffix(".prof").as_posix())
+            summary = io.StringIO()
+            pstats.Stats(self.__profiler, stream=summary).sort_stats(
+                "cumulative").print_stats(30)
+            return summary.getvalue()
+        path.with_suffix(".html").write_text(self.__profiler.output_html())
+        return self.__profiler.output_text()
+
+
+class ProfileStore(object):
+    """Bounded ring of request profiles on disk.
+
+    Each entry is a ``<id>.json`` with request details and SQL timings
+    plus the trace, ``<id>.html`` from pyinstrument or ``<id>.prof``
+    from the cProfile fallback.
+    """
+
+    @classmethod
+    def root(cls) -> Path:
+        return Path(app_config.api.data) / "profiles"
+
+    @classmethod
+    def path(cls, profile_id: str, *suffixes: str) -> Optional[Path]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        for suffix in suffixes:
+            path = cls.root() / f"{profile_id}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    @classmethod
+    def store(cls, meta: dict, profiler: Optional['RequestProfiler']) -> str:
+        root = cls.root()
+        root.mkdir(parents=True, exist_ok=True)
+        profile_id = f"{time.time_ns()}-{uuid4().hex[:8]}"
+        if profiler:
+            meta["profiler"] = profiler.kind
+            meta["summary"] = profiler.dump(root / profile_id)
+        meta["id"] = profile_id
+        (root / f"{profile_id}.json").write_text(
+            json.dumps(meta, default=str))
+        cls.prune()
+        return profile_id
+
+    @classmethod
+    def prune(cls):
+        entries = sorted(cls.root().glob("*.json"), reverse=True)
+        for entry in entries[max(1, app_config.profiling.size):]:
+            entry.unlink(missing_ok=True)
+            for suffix in TRACE_SUFFIXES:
+                entry.with_suffix(suffix).unlink(missing_ok=True)
+
+    @classmethod
+    def entries(cls) -> list[dict]:
+        result = []
+        for entry in sorted(cls.root().glob("*.json"), reverse=True):
+            try:
+                meta = json.loads(entry.read_text())
+            except (FileNotFoundError, ValueError):
+                continue
+            result.append({
+                k: v for k, v in meta.items()
+                if k not in ("queries", "summary")
+            })
+        return result
+
+
+class ProfilingMiddleware(object):
+    """Profiles requests carrying the admin token header or a sample of
+    all requests. Only installed when profiling is enabled."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.cfg = app_config.profiling
+
+    def wanted(self, scope) -> bool:
+        if scope["type"] != "http" or scope["path"].startswith("/api/admin"):
+            return False
+        if token_matches(dict(scope["headers"]).get(PROFILE_HEADER)):
+            return True
+        return random.random() < self.cfg.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.wanted(scope):
+            return await self.app(scope, receive, send)
+
+        status = dict(code=None)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        queries: list = []
+        reset = traced_queries.set(queries)
+        profiler: Optional[RequestProfiler] = RequestProfiler()
+        if not profiler.start():
+            profiler = None
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            if profiler:
+                profiler.stop()
+            traced_queries.reset(reset)
+            try:
+                ProfileStore.store(dict(
+                    method=scope["method"],
+                    path=scope["path"],
+                    query=scope["query_string"].decode(),
+                    status=status["code"],
+                    started=time.time() - duration,
+                    duration=duration,
+                    sql_count=len(queries),
+                    sql_duration=sum(x[2] for x in queries),
+                    queries=[
+                        dict(sql=sql, params=params, duration=elapsed)
+                        for sql, params, elapsed in queries
+                    ]
+                ), profiler)
+            except OSError as e:
+                logging.warning(f"profile not stored: {e}")
@@ -1,8 +1,10 @@
-import boto3
 from pathlib import Path
 from app.config import app_config
 import filetype
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+DELETE_BATCH_SIZE = 1000
 
 
 class S3Meta(type):
@@ -13,9 +15,26 @@ class S3Meta(type):
         logging.debug(f"upload {src} to {dst}")
         return cls().upload_file(src, dst, skip_upload)
 
+    def download(cls, key: str, dst: Path) -> Path:
+        logging.debug(f"download {key} to {dst}")
+        return cls().download_file(cls.src_key(key), dst)
+
     def delete(cls, key: str):
         return cls().delete_file(cls.src_key(key))
 
+    def delete_many(cls, keys: list[str], workers: int = 4) -> list[str]:
+        src_keys = list(map(cls.src_key, keys))
+        batches = [
+            src_keys[idx:idx + DELETE_BATCH_SIZE]
+            for idx in range(0, len(src_keys), DELETE_BATCH_SIZE)
+        ]
+        if not batches:
+            return []
+        client = cls()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = executor.map(client.delete_files, batches)
+        return [key for failed in results for key in failed]
+
     def src_key(cls, dst):
         return f"{app_config.aws.media_location}/{dst}"
 
@@ -23,6 +42,7 @@ class S3Meta(type):
 class S3(object, metaclass=S3Meta):
 
     def __init__(self) -> None:
+        import boto3
         cfg = app_config.aws
         self._client = boto3.client(
             service_name="s3",
@@ -45,6 +65,26 @@ class S3(object, metaclass=S3Meta):
             logging.debug(res)
         return key
 
+    def download_file(self, key: str, dst: Path) -> Path:
+        bucket = app_config.aws.storage_bucket_name
+        self._client.download_file(bucket, key, dst.as_posix())
+        return dst
+
     def delete_file(self, file_name: str) -> bool:
         bucket = app_config.aws.storage_bucket_name
         return self._client.delete_object(Bucket=bucket, Key=file_name)
+
+    def delete_files(self, file_names: list[str]) -> list[str]:
+        bucket = app_config.aws.storage_bucket_name
+        res = self._client.delete_objects(
+            Bucket=bucket,
+            Delete={
+                "Objects": [{"Key": name} for name in file_names],
+                "Quiet": True
+            },
+        )
+        errors = res.get("Errors", [])
+        for err in errors:
+            logging.warning(
+                f"delete {err.get('Key')} failed: {err.get('Message')}")
+        return [err["Key"] for err in errors]
@@ -0,0 +1,238 @@
+from threading import RLock
+from typing import Optional
+from itertools import product
+from .colors import hex_to_rgb
+import logging
+
+PaletteColors = list[tuple[tuple[int, ...], int]]
+
+BIN_LEVELS = (32, 96, 160, 224)
+BIN_SIGMA = 48.0
+VECTOR_SIZE = len(BIN_LEVELS) ** 3
+CHUNK_SIZE = 16384
+
+
+def bin_centers():
+    import numpy as np
+    return np.array(list(product(BIN_LEVELS, repeat=3)), dtype=np.float32)
+
+
+def palette_vectors(rgb, weights, offsets):
+    """Normalized weighted palette vectors, one row per offsets segment.
+
+    Colors are processed in chunks and squared distances are expanded as
+    |a|^2 + |c|^2 - 2a.c, so peak memory stays at CHUNK_SIZE x VECTOR_SIZE
+    whatever the catalogue size.
+    """
+    import numpy as np
+    centers = bin_centers()
+    rgb = np.asarray(rgb, dtype=np.float32).reshape(-1, 3)
+    weights = np.asarray(weights, dtype=np.float32)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    matrix = np.zeros((max(len(offsets) - 1, 0), VECTOR_SIZE),
+                      dtype=np.float32)
+    if not len(matrix) or not len(rgb):
+        return matrix
+    owners = np.repeat(np.arange(len(matrix)), np.diff(offsets))
+    centers_sq = np.sum(centers ** 2, axis=1)
+    for start in range(0, len(rgb), CHUNK_SIZE):
+        chunk = rgb[start:start + CHUNK_SIZE]
+        dist = chunk @ centers.T
+        dist *= -2
+        dist += np.sum(chunk ** 2, axis=1)[:, None]
+        dist += centers_sq[None]
+        np.maximum(dist, 0, out=dist)
+        dist *= -1 / (2 * BIN_SIGMA ** 2)
+        np.exp(dist, out=dist)
+        dist *= weights[start:start + CHUNK_SIZE, None]
+        uniq, first = np.unique(
+            owners[start:start + CHUNK_SIZE], return_index=True)
+        matrix[uniq] += np.add.reduceat(dist, first, axis=0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1)
+    return matrix
+
+
+class SimilarityIndexMeta(type):
+    _instance: Optional['SimilarityIndex'] = None
+
+    def __call__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = type.__call__(cls, *args, **kwargs)
+        return cls._instance
+
+    def similar(
+        cls,
+        artwork_id: int,
+        colors: PaletteColors,
+        limit: int = 20
+    ) -> list[int]:
+        return cls().find_similar(artwork_id, colors, limit)
+
+    def add(cls, artwork_id: int, colors: PaletteColors):
+        if cls._instance and cls._instance.loaded:
+            cls._instance.add_artwork(artwork_id, colors)
+
+    def remove(cls, *artwork_ids: int):
+        if cls._instance and cls._instance.loaded:
+            cls._instance.remove_artworks(artwork_ids)
+
+    def reload(cls):
+        cls().load()
+
+    def refresh(cls):
+        index = cls()
+        if not index.loaded:
+            index.ensure_loaded()
+        elif index.stale:
+            index.load()
+
+
+class SimilarityIndex(object, metaclass=SimilarityIndexMeta):
+    """In-memory nearest neighbour index over weighted palette vectors.
+
+    Every artwork is a fixed-length vector of soft color histogram bins,
+    each dominant color spreading its weight over nearby bins, normalized
+    so that a dot product gives the cosine similarity. When loaded from
+    the catalogue snapshot the matrix is the shared read-only mapping and
+    is only copied on the first upload or delete in this process.
+    """
+
+    def __init__(self) -> None:
+        import numpy as np
+        self.__lock = RLock()
+        self.__matrix = np.zeros((0, VECTOR_SIZE), dtype=np.float32)
+        self.__ids = np.zeros(0, dtype=np.int64)
+        self.__rows: dict[int, int] = {}
+        self.__size = 0
+        self.__snapshot = None
+        self.loaded = False
+
+    def vector(self, colors: PaletteColors):
+        return palette_vectors(
+            [rgb[:3] for rgb, _ in colors],
+            [weight for _, weight in colors],
+            [0, len(colors)]
+        )[0]
+
+    def load(self):
+        import numpy as np
+        from .snapshot import CatalogueSnapshot
+        snapshot = CatalogueSnapshot.load()
+        if snapshot is not None:
+            ids = snapshot.ids.tolist()
+            matrix = snapshot.vectors.reshape(-1, VECTOR_SIZE)
+            source = f"snapshot {snapshot.generation}"
+        else:
+            ids, matrix = self.load_database()
+            source = "database"
+        if not len(ids):
+            matrix = np.zeros((1, VECTOR_SIZE), dtype=np.float32)
+        with self.__lock:
+            self.__matrix = matrix
+            self.__ids = np.array(ids + [0] * (len(matrix) - len(ids)),
+                                  dtype=np.int64)
+            self.__rows = {
+                artwork_id: row for row, artwork_id in enumerate(ids)
+            }
+            self.__size = len(ids)
+            self.__snapshot = snapshot
+            self.loaded = True
+        logging.info(f"similarity index loaded {len(ids)} artworks "
+                     f"from {source}")
+
+    def load_database(self):
+        from app.database.models import Artwork, Artcolor
+        from app.database.database import Database
+        palettes: dict[int, PaletteColors] = {}
+        query = (
+            Artcolor.select(Artcolor.Artwork, Artcolor.Color, Artcolor.weight)
+            .join(Artwork)
+            .where(Artwork.deleted == False)
+            .tuples()
+        )
+        with Database.reads():
+            for artwork_id, color, weight in query:
+                palettes.setdefault(artwork_id, []).append(
+                    (hex_to_rgb(color), weight))
+        ids = list(palettes.keys())
+        offsets = [0]
+        for artwork_id in ids:
+            offsets.append(offsets[-1] + len(palettes[artwork_id]))
+        matrix = palette_vectors(
+            [rgb[:3] for x in ids for rgb, _ in palettes[x]],
+            [weight for x in ids for _, weight in palettes[x]],
+            offsets
+        )
+        return ids, matrix
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        with self.__lock:
+            if not self.loaded:
+                self.load()
+
+    @property
+    def stale(self) -> bool:
+        return self.__snapshot is None or self.__snapshot.stale
+
+    def add_artwork(self, artwork_id: int, colors: PaletteColors):
+        import numpy as np
+        vec = self.vector(colors)
+        with self.__lock:
+            row = self.__rows.get(artwork_id)
+            if not self.__matrix.flags.writeable:
+                self.__matrix = self.__matrix.copy()
+            if row is None:
+                if self.__size == len(self.__matrix):
+                    capacity = max(2 * self.__size, 16)
+                    matrix = np.zeros((capacity, self.__matrix.shape[1]),
+                                      dtype=np.float32)
+                    matrix[:self.__size] = self.__matrix[:self.__size]
+                    ids = np.zeros(capacity, dtype=np.int64)
+                    ids[:self.__size] = self.__ids[:self.__size]
+                    self.__matrix, self.__ids = matrix, ids
+                row = self.__size
+                self.__size += 1
+                self.__rows[artwork_id] = row
+                self.__ids[row] = artwork_id
+            self.__matrix[row] = vec
+
+    def remove_artworks(self, artwork_ids):
+        with self.__lock:
+            for artwork_id in artwork_ids:
+                row = self.__rows.pop(artwork_id, None)
+                if row is None:
+                    continue
+                last = self.__size - 1
+                if row != last:
+                    if not self.__matrix.flags.writeable:
+                        self.__matrix = self.__matrix.copy()
+                    moved = int(self.__ids[last])
+                    self.__matrix[row] = self.__matrix[last]
+                    self.__ids[row] = moved
+                    self.__rows[moved] = row
+                self.__size = last
+
+    def find_similar(
+        self,
+        artwork_id: int,
+        colors: PaletteColors,
+        limit: int
+    ) -> list[int]:
+        import numpy as np
+        self.ensure_loaded()
+        if artwork_id not in self.__rows and colors:
+            self.add_artwork(artwork_id, colors)
+        with self.__lock:
+            row = self.__rows.get(artwork_id)
+            if row is None or self.__size < 2:
+                return []
+            matrix = self.__matrix[:self.__size]
+            scores = matrix @ matrix[row]
+            scores[row] = -np.inf
+            k = min(limit, self.__size - 1)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return self.__ids[top].tolist()
@@ -0,0 +1,212 @@
+from pathlib import Path
+from typing import Optional, Iterator
+from app.config import app_config
+from .colors import hex_to_int, int_to_rgb
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"WALSNAP\0"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIQIII")
+ALIGN = 8
+REFRESH_MINUTES = 10
+
+Palette = list[tuple[tuple[int, ...], int]]
+
+# (name, dtype, length key) in file order, length key is "n", "n1" (n + 1),
+# "m", "s" or "v" for artworks, offsets, colors, slug bytes and palette
+# vector floats respectively
+LAYOUT = (
+    ("ids", "<i8", "n"),
+    ("timestamps", "<f8", "n"),
+    ("categories", "u1", "n"),
+    ("color_offsets", "<u4", "n1"),
+    ("colors", "<u4", "m"),
+    ("weights", "<u2", "m"),
+    ("slug_offsets", "<u4", "n1"),
+    ("slugs", "u1", "s"),
+    ("vectors", "<f4", "v"),
+)
+
+
+def snapshot_path() -> Path:
+    return Path(app_config.api.data) / "catalogue.snap"
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _lengths(n: int, m: int, s: int) -> dict[str, int]:
+    from .similar import VECTOR_SIZE
+    return dict(n=n, n1=n + 1, m=m, s=s, v=n * VECTOR_SIZE)
+
+
+def write_snapshot(path: Optional[Path] = None) -> Path:
+    """Dump live artworks and their palettes, replacing the file atomically."""
+    import numpy as np
+    from app.database.models import Artwork, Artcolor
+    from app.database.database import Database
+    from app.database.fields import Category
+    from .similar import palette_vectors
+
+    path = path or snapshot_path()
+    categories = Category.values()
+    rows: dict[int, list] = {}
+    palettes: dict[int, list[tuple[int, int]]] = {}
+    with Database.reads():
+        for artwork_id, slug, category, last_modified in (
+            Artwork.select(
+                Artwork.id, Artwork.slug, Artwork.Category,
+                Artwork.last_modified
+            )
+            .where(Artwork.deleted == False)
+            .order_by(Artwork.id)
+            .tuples()
+        ):
+            rows[artwork_id] = [slug, category, last_modified]
+        for artwork_id, color, weight in (
+            Artcolor.select(Artcolor.Artwork, Artcolor.Color, Artcolor.weight)
+            .join(Artwork)
+            .where(Artwork.deleted == False)
+            .order_by(Artcolor.Artwork, Artcolor.weight.desc())
+            .tuples()
+        ):
+            palettes.setdefault(artwork_id, []).append(
+                (hex_to_int(color), weight))
+
+    ids = [artwork_id for artwork_id in rows if artwork_id in palettes]
+    slugs = [rows[artwork_id][0].encode() for artwork_id in ids]
+    colors = [color for x in ids for color, _ in palettes[x]]
+    color_offsets = np.cumsum(
+        [0] + [len(palettes[x]) for x in ids], dtype="<u4")
+    np_colors = np.array(colors, dtype="<u4")
+    weights = np.array(
+        [weight for x in ids for _, weight in palettes[x]], dtype="<u2")
+    arrays = dict(
+        ids=np.array(ids, dtype="<i8"),
+        timestamps=np.array(
+            [rows[x][2].timestamp() for x in ids], dtype="<f8"),
+        categories=np.array(
+            [categories.index(rows[x][1].value) for x in ids], dtype="u1"),
+        color_offsets=color_offsets,
+        colors=np_colors,
+        weights=weights,
+        slug_offsets=np.cumsum([0] + list(map(len, slugs)), dtype="<u4"),
+        slugs=np.frombuffer(b"".join(slugs), dtype="u1"),
+        vectors=palette_vectors(
+            np.stack([np_colors >> 16 & 255, np_colors >> 8 & 255,
+                      np_colors & 255], axis=1),
+            weights,
+            color_offsets
+        ).astype("<f4"),
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as fp:
+        fp.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, time.time_ns(),
+            len(ids), len(colors), len(arrays["slugs"])
+        ))
+        for name, _, _ in LAYOUT:
+            fp.write(b"\0" * (_aligned(fp.tell()) - fp.tell()))
+            fp.write(arrays[name].tobytes())
+        fp.flush()
+        os.fsync(fp.fileno())
+    tmp.replace(path)
+    logging.info(f"catalogue snapshot {path} written, {len(ids)} artworks")
+    return path
+
+
+def refresh_snapshot(max_age: float = REFRESH_MINUTES * 60 / 2) -> bool:
+    """Rewrite the snapshot unless another process did so recently."""
+    path = snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.with_suffix(".lock").open("w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        try:
+            if time.time() - path.stat().st_mtime < max_age:
+                return False
+        except FileNotFoundError:
+            pass
+        write_snapshot(path)
+        return True
+
+
+class CatalogueSnapshot(object):
+    """Read-only memory mapped view of a file written by write_snapshot.
+
+    The arrays are views into the shared mapping, so every process
+    opening the same file reads the same pages.
+    """
+
+    def __init__(self, path: Path) -> None:
+        import numpy as np
+        self.path = path
+        with path.open("rb") as fp:
+            self.__stat = os.fstat(fp.fileno())
+            self.__mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, generation, n, m, s = HEADER.unpack_from(self.__mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"unsupported snapshot {path} v{version}")
+        self.generation = generation
+        lengths = _lengths(n, m, s)
+        offset = HEADER.size
+        for name, dtype, length in LAYOUT:
+            offset = _aligned(offset)
+            arr = np.frombuffer(
+                self.__mmap, dtype=dtype, count=lengths[length],
+                offset=offset)
+            setattr(self, name, arr)
+            offset += arr.nbytes
+
+    @classmethod
+    def load(
+        cls,
+        path: Optional[Path] = None
+    ) -> Optional['CatalogueSnapshot']:
+        try:
+            return cls(path or snapshot_path())
+        except (FileNotFoundError, ValueError, struct.error) as e:
+            logging.debug(f"catalogue snapshot not loaded: {e}")
+            return None
+
+    @property
+    def stale(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != (
+            self.__stat.st_ino, self.__stat.st_mtime_ns)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def slug(self, row: int) -> str:
+        start, end = self.slug_offsets[row:row + 2]
+        return self.slugs[start:end].tobytes().decode()
+
+    def category(self, row: int) -> str:
+        from app.database.fields import Category
+        return Category.values()[self.categories[row]]
+
+    def palette(self, row: int) -> Palette:
+        start, end = self.color_offsets[row:row + 2]
+        return [
+            (int_to_rgb(int(color)), int(weight))
+            for color, weight in zip(
+                self.colors[start:end], self.weights[start:end])
+        ]
+
+    def palettes(self) -> Iterator[tuple[int, Palette]]:
+        for row, artwork_id in enumerate(self.ids):
+            yield int(artwork_id), self.palette(row)
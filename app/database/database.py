@@ -2,17 +2,89 @@ from playhouse.db_url import parse
 from playhouse.postgres_ext import PostgresqlExtDatabase
 from app.config import app_config
 from typing import Optional, Any
-from psycopg2 import OperationalError
+from psycopg2 import OperationalError, Error as DriverError
+import peewee
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import local
+import logging
+import random
+import time
+
+traced_queries: ContextVar[Optional[list]] = ContextVar(
+    "traced_queries", default=None)
+
+
+def trace_query(sql: str, params: Any, started: float):
+    if (queries := traced_queries.get()) is not None:
+        queries.append((sql, params, time.perf_counter() - started))
 
 
 class ReconnectingDB(PostgresqlExtDatabase):
-    
+    trace_queries = False
+
     def execute_sql(self, sql, params: Any | None = ..., commit=...):
+        started = time.perf_counter() if self.trace_queries else None
         try:
             return super().execute_sql(sql, params, commit)
         except OperationalError as e:
             print(e)
             raise RuntimeError
+        finally:
+            if started is not None:
+                trace_query(sql, params, started)
+
+
+class RoutingDB(ReconnectingDB):
+
+    def __init__(
+        self,
+        *args,
+        replicas: Optional[list[ReconnectingDB]] = None,
+        replica_lag: float = 5.0,
+        **kwargs
+    ):
+        self.replicas = replicas or []
+        self.replica_lag = replica_lag
+        self.__routing = local()
+        self.__last_write = 0.0
+        super().__init__(*args, **kwargs)
+
+    @contextmanager
+    def reads(self):
+        previous = getattr(self.__routing, "reads", False)
+        self.__routing.reads = True
+        try:
+            yield self
+        finally:
+            self.__routing.reads = previous
+
+    def mark_write(self):
+        self.__last_write = time.monotonic()
+
+    def use_replica(self, sql: str) -> bool:
+        return all([
+            self.replicas,
+            getattr(self.__routing, "reads", False),
+            sql.lstrip()[:6].upper() == "SELECT",
+            not self.in_transaction(),
+            time.monotonic() - self.__last_write > self.replica_lag,
+        ])
+
+    def execute_sql(self, sql, params: Any | None = ..., commit=...):
+        if self.use_replica(sql):
+            replica = random.choice(self.replicas)
+            try:
+                return replica.execute_sql(sql, params, commit)
+            except (peewee.OperationalError, peewee.InterfaceError,
+                    RuntimeError) as e:
+                logging.warning(f"replica failed, reading from primary: {e}")
+                try:
+                    replica.close()
+                except (peewee.PeeweeException, DriverError):
+                    pass
+        return super().execute_sql(sql, params, commit)
+
 
 class DatabaseMeta(type):
     _instance: Optional['Database'] = None
@@ -23,15 +95,22 @@ class DatabaseMeta(type):
         return cls._instance
 
     @property
-    def db(cls) -> ReconnectingDB:
+    def db(cls) -> RoutingDB:
         return cls().get_db()
 
+    def reads(cls):
+        return cls().get_db().reads()
+
 
 class Database(object, metaclass=DatabaseMeta):
 
     def __init__(self):
-        parsed = parse(app_config.db.url)
-        self.__db = ReconnectingDB(**parsed)
+        cfg = app_config.db
+        self.__db = RoutingDB(
+            replicas=[ReconnectingDB(**parse(url)) for url in cfg.replicas],
+            replica_lag=cfg.replica_lag,
+            **parse(cfg.url)
+        )
 
-    def get_db(self) -> ReconnectingDB:
+    def get_db(self) -> RoutingDB:
         return self.__db
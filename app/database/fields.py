@@ -1,11 +1,9 @@
 from peewee import CharField, IntegerField
 from enum import StrEnum
 from app.core.colors import int_to_hex
-from app.core.s3 import S3
 from uuid import uuid4
 from pathlib import Path
 from corefile import TempPath
-from PIL import Image
 
 
 class Category(StrEnum):
@@ -31,6 +29,11 @@ class Source(StrEnum):
     MASHA = "masha"
 
 
+class FacetKind(StrEnum):
+    CATEGORY = "category"
+    COLOR = "color"
+
+
 class CategoryField(CharField):
 
     def db_value(self, value: Category):
@@ -54,6 +57,9 @@ class ColorField(IntegerField):
 class ImageField(CharField):
 
     def db_value(self, value: str):
+        from app.core.s3 import S3
+        from app.core.derivatives import upload_derivatives
+        from PIL import Image
         image_path = Path(value)
         assert image_path.exists()
         stem = uuid4().hex
@@ -62,6 +68,9 @@ class ImageField(CharField):
         S3.upload(image_path, raw_fname)
 
         img = Image.open(image_path.as_posix())
+        img.load()
+
+        upload_derivatives(img, stem)
 
         webp_fname = f"{stem}.webp"
         webp_path = TempPath(webp_fname)
@@ -1,6 +1,6 @@
-from peewee import Model, DoesNotExist
+from peewee import Model, DoesNotExist, EXCLUDED, fn
 from .database import Database
-from .fields import CategoryField, ColorField, ImageField, Source
+from .fields import CategoryField, ColorField, ImageField, Source, FacetKind
 from playhouse.shortcuts import model_to_dict
 from peewee import (
     CharField,
@@ -9,10 +9,17 @@ from peewee import (
     ForeignKeyField,
     BooleanField,
 )
-from faker import Faker
 from app.config import app_config
 from pathlib import Path
 from stringcase import spinalcase
+from app.core.colors import color_bucket, hex_to_rgb, int_to_hex
+from app.core.derivatives import (
+    derivative_names,
+    derivative_signature,
+    source_width,
+    MIME_TYPES
+)
+from functools import cache
 import datetime
 
 CDN_ROOT = (
@@ -20,11 +27,15 @@ CDN_ROOT = (
     f"/{app_config.aws.media_location}"
 )
 
-fake = Faker()
+
+@cache
+def get_faker():
+    from faker import Faker
+    return Faker()
 
 
 def get_default_name():
-    return fake.text(max_nb_chars=30).strip(".")
+    return get_faker().text(max_nb_chars=30).strip(".")
 
 
 class DbModel(Model):
@@ -48,16 +59,78 @@ class Artwork(DbModel):
     Source = CharField(default=Source.MASHA.value)
     deleted = BooleanField(default=False)
     botyo_id = CharField(null=True)
+    derivatives = CharField(max_length=255, null=True)
+
+    @classmethod
+    def ensure_columns(cls):
+        from playhouse.migrate import PostgresqlMigrator, migrate
+        db = cls._meta.database
+        table = cls._meta.table_name
+        columns = {c.name for c in db.get_columns(table)}
+        migrator = PostgresqlMigrator(db)
+        migrate(*[
+            migrator.add_column(table, field.column_name, field)
+            for field in cls._meta.sorted_fields
+            if field.column_name not in columns
+        ])
 
     def delete_instance(self, recursive=False, delete_nullable=False):
+        from app.core.similar import SimilarityIndex
+        now = datetime.datetime.now()
+        with self._meta.database.atomic():
+            updated = Artwork.update(deleted=True, last_modified=now).where(
+                Artwork.id == self.id,
+                Artwork.deleted == False
+            ).execute()
+            if updated == 1:
+                Facet.track(self.Category, [
+                    hex_to_rgb(artcolor.Color)
+                    for artcolor in Artcolor.select().where(
+                        Artcolor.Artwork == self)
+                ], -1)
         self.deleted = True
-        self.last_modified = datetime.datetime.now()
-        self.save(only=["deleted", "last_modified"])
+        self.last_modified = now
+        if updated == 1:
+            SimilarityIndex.remove(self.id)
 
     def save(self, *args, **kwds):
         self.slug = spinalcase(self.Name)
+        if self.get_id() is None and self.derivatives is None:
+            # ImageField.db_value uploads the set planned for this width
+            from PIL import Image
+            with Image.open(self.Image) as img:
+                self.derivatives = derivative_signature(img.width)
         return super().save(*args, **kwds)
 
+    @property
+    def image_files(self) -> list[str]:
+        stem = (Path(self.Image)).stem
+        signatures = [self.derivatives]
+        if width := source_width(self.derivatives):
+            # the set currently planned for the same source, in case a
+            # backfill uploaded it before failing; S3 ignores missing keys
+            signatures.append(derivative_signature(width))
+        return [
+            f"{stem}.png.png",
+            f"{stem}.webp",
+            f"{stem}.thumbnail.webp",
+            *dict.fromkeys(
+                fname
+                for signature in signatures
+                for _, _, fname in derivative_names(stem, signature)
+            )
+        ]
+
+    @property
+    def srcset(self) -> list[dict]:
+        if source_width(self.derivatives) is None:
+            return []
+        stem = (Path(self.Image)).stem
+        return [
+            dict(src=f"{CDN_ROOT}/{fname}", width=width, type=MIME_TYPES[fmt])
+            for width, fmt, fname in derivative_names(stem, self.derivatives)
+        ]
+
     @property
     def raw_src(self) -> str:
         stem = (Path(self.Image)).stem
@@ -92,3 +165,74 @@ class Artcolor(DbModel):
         database = Database.db
         table_name = 'walls_artcolor'
         order_by = ["-weight"]
+
+
+class Facet(DbModel):
+    kind = CharField(max_length=16)
+    key = CharField(max_length=32)
+    count = IntegerField(default=0)
+
+    @classmethod
+    def ensure(cls):
+        if not cls.table_exists():
+            cls.create_table()
+            cls.rebuild()
+
+    @classmethod
+    def track(cls, category: str, colors: list[tuple[int, ...]], delta: int):
+        rows = [
+            dict(kind=FacetKind.CATEGORY.value, key=category, count=delta),
+            *[
+                dict(kind=FacetKind.COLOR.value, key=int_to_hex(bucket),
+                     count=delta)
+                for bucket in set(map(color_bucket, colors))
+            ]
+        ]
+        cls.insert_many(rows).on_conflict(
+            conflict_target=[cls.kind, cls.key],
+            update={cls.count: cls.count + EXCLUDED.count}
+        ).execute()
+
+    @classmethod
+    def rebuild(cls):
+        counts: dict[tuple[str, str], int] = {}
+        for artwork in Artwork.select(
+            Artwork.Category,
+            fn.COUNT(Artwork.id).alias("count")
+        ).where(Artwork.deleted == False).group_by(Artwork.Category):
+            key = (FacetKind.CATEGORY.value, artwork.Category.value)
+            counts[key] = artwork.count
+        buckets: dict[int, set[int]] = {}
+        for artwork_id, color in (
+            Artcolor.select(Artcolor.Artwork, Artcolor.Color)
+            .join(Artwork)
+            .where(Artwork.deleted == False)
+            .tuples()
+        ):
+            buckets.setdefault(artwork_id, set()).add(
+                color_bucket(hex_to_rgb(color)))
+        for bucket_set in buckets.values():
+            for bucket in bucket_set:
+                key = (FacetKind.COLOR.value, int_to_hex(bucket))
+                counts[key] = counts.get(key, 0) + 1
+        with cls._meta.database.atomic():
+            cls.delete().execute()
+            if counts:
+                cls.insert_many([
+                    dict(kind=kind, key=key, count=count)
+                    for (kind, key), count in counts.items()
+                ]).execute()
+
+    @classmethod
+    def counts(cls) -> dict[str, dict[str, int]]:
+        result: dict[str, dict[str, int]] = {
+            kind.value: {} for kind in FacetKind}
+        for facet in cls.select().where(cls.count > 0).order_by(
+                cls.kind, cls.count.desc()):
+            result.setdefault(facet.kind, {})[facet.key] = facet.count
+        return result
+
+    class Meta:
+        database = Database.db
+        table_name = 'walls_facet'
+        indexes = ((("kind", "key"), True),)
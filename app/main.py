@@ -5,6 +5,9 @@ from app.config import app_config
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from app.scheduler import Scheduler
+from app.core.similar import SimilarityIndex
+from app.core.snapshot import refresh_snapshot, REFRESH_MINUTES
+from datetime import datetime, timezone
 import trio
 from hypercorn.config import Config
 from hypercorn.trio import serve as hypercorn_serve
@@ -47,12 +50,46 @@ def create_app():
                         'x-pagination-next']
     )
 
+    if app_config.profiling.enabled:
+        from .routers import admin
+        from app.core.profiling import ProfilingMiddleware
+        from app.database.database import ReconnectingDB
+        ReconnectingDB.trace_queries = True
+        app.add_middleware(ProfilingMiddleware)
+        app.include_router(admin.router)
+
     app.include_router(api.router)
     return app
 
 
+def refresh_catalogue():
+    refresh_snapshot()
+    SimilarityIndex.refresh()
+
+
 def serve():
+    from app.core.gc import collect_garbage
+    from app.database.models import Artwork, Facet
+    Artwork.ensure_columns()
+    Facet.ensure()
     Scheduler.start()
+    Scheduler.add_job(
+        collect_garbage,
+        name="collect_garbage",
+        id="collect_garbage",
+        trigger="interval",
+        hours=app_config.gc.interval_hours,
+        replace_existing=True
+    )
+    Scheduler.add_job(
+        refresh_catalogue,
+        name="refresh_catalogue",
+        id="refresh_catalogue",
+        trigger="interval",
+        minutes=REFRESH_MINUTES,
+        next_run_time=datetime.now(tz=timezone.utc),
+        replace_existing=True
+    )
     server_config = Config.from_mapping(
         bind=f"{app_config.api.host}:{app_config.api.port}",
         worker_class="trio"
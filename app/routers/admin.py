@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from typing import Optional
+from app.core.profiling import ProfileStore, TRACE_SUFFIXES, token_matches
+import json
+
+
+def check_token(x_profile_token: Optional[str] = Header(default=None)):
+    if not token_matches(x_profile_token):
+        raise HTTPException(403)
+
+
+router = APIRouter(dependencies=[Depends(check_token)])
+
+
+@router.get("/api/admin/profiles", tags=["admin"])
+async def list_profiles():
+    return ProfileStore.entries()
+
+
+@router.get("/api/admin/profiles/{profile_id}", tags=["admin"])
+async def get_profile(profile_id: str, download: bool = False):
+    if download:
+        if not (path := ProfileStore.path(profile_id, *TRACE_SUFFIXES)):
+            raise HTTPException(404)
+        return FileResponse(
+            path.as_posix(),
+            filename=path.name
+        )
+    if not (path := ProfileStore.path(profile_id, ".json")):
+        raise HTTPException(404)
+    return json.loads(path.read_text())
@@ -6,9 +6,11 @@ from uuid import uuid4
 from fastapi import APIRouter, HTTPException, Request, Form, File
 from app.database.fields import Category
 from app.database.database import Database
-from app.database.models import Artwork, Artcolor
+from app.database.models import Artwork, Artcolor, Facet
 from fastapi.responses import JSONResponse
 from app.core.colors import (
+    bucket_bits,
+    hex_to_int,
     hex_to_rgb,
     int_to_rgb,
     similar_colors,
@@ -19,7 +21,8 @@ from corestring import split_with_quotes
 from corefile import TempPath
 from peewee import fn
 from app.scheduler import Scheduler
-from app.core.palette import generate_palette
+from app.core.palette import generate_palette, load_palette
+from app.core.similar import SimilarityIndex
 from datetime import datetime, timedelta, timezone
 from app.config import app_config
 from urllib.parse import urlencode
@@ -34,6 +37,7 @@ def get_next_url(
     last_modified: Optional[float] = None,
     category: Optional[str] = None,
     color: Optional[str] = None,
+    bucket: Optional[str] = None,
 ):
     try:
         last_page = ceil(total/limit)
@@ -44,6 +48,7 @@ def get_next_url(
             limit=limit,
             category=category,
             color=color,
+            bucket=bucket,
             last_modified=last_modified
         ).items() if v}
         return f"{app_config.api.web_host}/api/artworks?{urlencode(params)}"
@@ -51,12 +56,45 @@ def get_next_url(
         return None
 
 
+def get_artwork_payload(artwork: Artwork) -> dict:
+    return dict(
+        title=artwork.Name,
+        raw_src=artwork.raw_src,
+        web_uri=artwork.web_uri,
+        webp_src=artwork.webp_src,
+        thumb_src=artwork.thumb_src,
+        srcset=artwork.srcset,
+        category=artwork.Category,
+        colors=artwork.colors,
+        id=artwork.slug,
+        last_modified=datetime.timestamp(artwork.last_modified),
+        deleted=artwork.deleted
+    )
+
+
+def get_artworks_by_ids(ids: list[int]) -> list[Artwork]:
+    if not ids:
+        return []
+    found = {
+        artwork.id: artwork
+        for artwork in Artwork.select(
+            Artwork,
+            fn.string_agg(Artcolor.Color.cast("text"), ",").alias("colors")
+        )
+        .join(Artcolor)
+        .where(Artwork.id.in_(ids), Artwork.deleted == False)
+        .group_by(Artwork)
+    }
+    return [found[artwork_id] for artwork_id in ids if artwork_id in found]
+
+
 def get_list_response(
     category: Optional[str] = None,
     color: Optional[str] = None,
     page: int = 1,
     limit: int = 20,
-    last_modified: Optional[float] = None
+    last_modified: Optional[float] = None,
+    bucket: Optional[str] = None
 ):
     results = []
     filters = [Artwork.deleted == False]
@@ -101,6 +139,16 @@ def get_list_response(
     except AssertionError:
         pass
 
+    try:
+        assert bucket
+        buckets = [hex_to_int(x) for x in split_with_quotes(bucket, ",")]
+        assert buckets
+        mask, offset = bucket_bits()
+        filters.append(
+            Artcolor.Color.bin_and(mask).bin_or(offset).in_(buckets))
+    except (AssertionError, ValueError):
+        pass
+
     base_query = Artwork.select(
         Artwork,
         fn.string_agg(Artcolor.Color.cast("text"), ",").alias("colors")
@@ -109,18 +157,10 @@ def get_list_response(
     query = base_query.where(*filters).join(Artcolor).group_by(Artwork)
 
     if page == -1:
-        results = [dict(
-            title=artwork.Name,
-            raw_src=artwork.raw_src,
-            web_uri=artwork.web_uri,
-            webp_src=artwork.webp_src,
-            thumb_src=artwork.thumb_src,
-            category=artwork.Category,
-            colors=artwork.colors,
-            id=artwork.slug,
-            last_modified=datetime.timestamp(artwork.last_modified),
-            deleted=artwork.deleted
-        ) for artwork in query.order_by(fn.Random()).limit(limit)]
+        results = [
+            get_artwork_payload(artwork)
+            for artwork in query.order_by(fn.Random()).limit(limit)
+        ]
         return JSONResponse(content=results)
 
     else:
@@ -130,18 +170,11 @@ def get_list_response(
         if total > 0:
             page = min(max(1, page), floor(total / limit) + 1)
 
-        results = [dict(
-            title=artwork.Name,
-            raw_src=artwork.raw_src,
-            web_uri=artwork.web_uri,
-            webp_src=artwork.webp_src,
-            thumb_src=artwork.thumb_src,
-            category=artwork.Category,
-            colors=artwork.colors,
-            id=artwork.slug,
-            last_modified=datetime.timestamp(artwork.last_modified),
-            deleted=artwork.deleted
-        ) for artwork in query.order_by(Artwork.last_modified.desc()).paginate(page, limit)]
+        results = [
+            get_artwork_payload(artwork)
+            for artwork in query.order_by(
+                Artwork.last_modified.desc()).paginate(page, limit)
+        ]
         headers = {
             "x-pagination-total": f"{total}",
             "x-pagination-page": f"{page}",
@@ -152,7 +185,8 @@ def get_list_response(
                 limit=limit,
                 last_modified=last_modified,
                 category=category,
-                color=color
+                color=color,
+                bucket=bucket
         ):
             headers["x-pagination-next"] = next_url
         return JSONResponse(content=results, headers=headers)
@@ -164,45 +198,114 @@ async def list_artworks(
     color: Optional[str] = None,
     page: int = 1,
     limit: int = 20,
-    last_modified: Optional[float] = None
+    last_modified: Optional[float] = None,
+    bucket: Optional[str] = None
 ):
-    return get_list_response(
-        category=category,
-        color=color,
-        page=page,
-        limit=limit,
-        last_modified=last_modified
-    )
+    with Database.reads():
+        return get_list_response(
+            category=category,
+            color=color,
+            page=page,
+            limit=limit,
+            last_modified=last_modified,
+            bucket=bucket
+        )
 
 
 @router.get("/api/artwork/{title}", tags=["api"])
 async def get_artwork(title: str):
     try:
-        artwork = (
-            Artwork
-            .select(
-                Artwork,
-                fn.string_agg(Artcolor.Color.cast(
-                    "text"), ",").alias("colors")
-            ).join(Artcolor)
-            .where((Artwork.slug == title) | (Artwork.botyo_id == title))
-            .group_by(Artwork)
-            .get()
-        )
+        with Database.reads():
+            artwork = (
+                Artwork
+                .select(
+                    Artwork,
+                    fn.string_agg(Artcolor.Color.cast(
+                        "text"), ",").alias("colors")
+                ).join(Artcolor)
+                .where((Artwork.slug == title) | (Artwork.botyo_id == title))
+                .group_by(Artwork)
+                .get()
+            )
         assert artwork
-        return dict(
-            title=artwork.Name,
-            raw_src=artwork.raw_src,
-            web_uri=artwork.web_uri,
-            webp_src=artwork.webp_src,
-            category=artwork.Category,
-            colors=artwork.colors,
-            id=artwork.slug,
-            last_modified=datetime.timestamp(artwork.last_modified),
-            deleted=artwork.deleted
+        return get_artwork_payload(artwork)
+    except (AssertionError, Artwork.DoesNotExist):
+        raise HTTPException(404)
+
+
+@router.get("/api/artwork/{title}/similar", tags=["api"])
+def get_similar(title: str, limit: int = 20):
+    with Database.reads():
+        artwork = Artwork.fetch(
+            (Artwork.deleted == False)
+            & ((Artwork.slug == title) | (Artwork.botyo_id == title))
         )
-    except AssertionError:
+        if not artwork:
+            raise HTTPException(404)
+        colors = [
+            (hex_to_rgb(artcolor.Color), artcolor.weight)
+            for artcolor in Artcolor.select().where(
+                Artcolor.Artwork == artwork)
+        ]
+        ids = SimilarityIndex.similar(
+            artwork.id, colors, max(1, min(limit, 100)))
+        if not ids:
+            return JSONResponse(content=[])
+        artworks = get_artworks_by_ids(ids)
+        if stale := set(ids) - {artwork.id for artwork in artworks}:
+            SimilarityIndex.remove(*stale)
+        return JSONResponse(content=list(map(get_artwork_payload, artworks)))
+
+
+@router.get("/api/facets", tags=["api"])
+async def get_facets():
+    with Database.reads():
+        return Facet.counts()
+
+
+@router.get("/api/palette", tags=["api"])
+async def get_palette():
+    data = load_palette()
+    if not data:
+        raise HTTPException(404)
+    return dict(
+        version=data["version"],
+        generated=data["generated"],
+        swatches=[
+            dict(
+                color=swatch["color"],
+                colors=swatch["colors"],
+                total=len(swatch["artworks"])
+            )
+            for swatch in data["swatches"]
+        ]
+    )
+
+
+@router.get("/api/palette/{color}/artworks", tags=["api"])
+async def get_palette_artworks(color: str, page: int = 1, limit: int = 20):
+    data = load_palette()
+    if not data or not (swatch := data["index"].get(color.upper())):
         raise HTTPException(404)
+    limit = max(1, min(limit, 100))
+    total = len(swatch["artworks"])
+    page = min(max(1, page), floor(total / limit) + 1)
+    ids = swatch["artworks"][(page - 1) * limit:page * limit]
+    with Database.reads():
+        artworks = get_artworks_by_ids(ids)
+    headers = {
+        "x-pagination-total": f"{total}",
+        "x-pagination-page": f"{page}",
+    }
+    if page * limit < total:
+        headers["x-pagination-next"] = (
+            f"{app_config.api.web_host}/api/palette/{swatch['color']}"
+            f"/artworks?{urlencode(dict(page=page + 1, limit=limit))}"
+        )
+    return JSONResponse(
+        content=list(map(get_artwork_payload, artworks)),
+        headers=headers
+    )
 
 
 @router.post("/api/artworks", tags=["api"])
@@ -231,6 +334,7 @@ def create_upload_file(
             )
             for idx, color in enumerate(colors)
         ])
+        Facet.track(obj.Category, colors, 1)
         logging.debug(obj)
         Scheduler.add_job(
             generate_palette,
@@ -239,4 +343,9 @@ def create_upload_file(
             replace_existing=True,
             run_date=datetime.now(tz=timezone.utc) + timedelta(minutes=2)
         )
-        return obj.to_dict()
+    Database.db.mark_write()
+    SimilarityIndex.add(obj.id, [
+        (color, 2 ** (5 - idx))
+        for idx, color in enumerate(colors)
+    ])
+    return obj.to_dict()